@@ -1,50 +1,309 @@
 from pathlib import Path
+import heapq
+import queue
 import sqlite3
 import secrets
+import threading
 import time
+from bisect import bisect_right
 from functools import wraps
 
-from flask import Flask, abort, g, redirect, render_template, request, send_from_directory, url_for
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import (
+    Flask,
+    abort,
+    g,
+    has_app_context,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    send_from_directory,
+    url_for,
+)
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.security import check_password_hash
 
 # Використовуємо шаблони та статичні файли з папки addition
 BASE_DIR = Path(__file__).resolve().parent
 DB_PATH = BASE_DIR / "DBs" / "points.db"
+JINJA_CACHE_DIR = BASE_DIR / ".jinja_cache"
 
 # Сховище сесій у пам'яті процесу додатку
 SESSIONS: dict[str, dict] = {}
+
+# Хешування паролів Argon2id; старі хеші Werkzeug перевіряються і замінюються при вході
+PASSWORD_HASHER = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=1)
+ARGON2_HASH_PREFIX = "$argon2"
+# Хеш для перевірки при неіснуючому логіні, щоб час відповіді не видавав наявність користувача
+DUMMY_PASSWORD_HASH = PASSWORD_HASHER.hash(secrets.token_urlsafe(16))
+
+# Спільний пул відкритих з'єднань з БД для запитів (див. get_conn / release_db).
+# Зайві з'єднання понад DB_POOL_SIZE закриваються після запиту.
+DB_POOL_SIZE = 8
+_DB_POOL: queue.LifoQueue = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+# З'єднання для коду поза контекстом додатку (скрипти, REPL)
+_THREAD_DB = threading.local()
+# Як часто довгоживуче з'єднання з пулу виконує PRAGMA optimize
+OPTIMIZE_INTERVAL_SECONDS = 10 * 60
 SESSION_TTL_SECONDS = 60 * 60  # 1 година
+# Купа (expires_at, session_id) для прибирання прострочених сесій без повного перебору.
+# Записи продовжених або видалених сесій застарівають і відкидаються при витягуванні.
+_EXPIRY_HEAP: list[tuple[int, str]] = []
+# Прибирання сесій виконується не частіше ніж раз на хвилину
+SESSION_SWEEP_INTERVAL_SECONDS = 60
+_last_sweep_at = 0
+# Захищає купу термінів дії та _last_sweep_at від одночасних потоків
+_SESSION_HEAP_LOCK = threading.Lock()
+
+# Зображення не змінюються, тож браузер може кешувати їх на рік
+IMAGES_MAX_AGE_SECONDS = 365 * 24 * 60 * 60
+# index.html, style.css та script.js можуть змінюватися, тож кешуємо їх на годину
+ROOT_FILES_MAX_AGE_SECONDS = 60 * 60
+
+# ETag сторінок звітів будується з версії даних у таблиці data_version, яку
+# збільшують тригери. Випадковий префікс робить ETag-и попереднього запуску
+# процесу недійсними (наприклад, після зміни шаблонів).
+DATA_ETAG_PREFIX = secrets.token_hex(8)
+
+# Короткочасний кеш результатів запитів до довідників (студенти, дисципліни),
+# які змінюються рідко: (запит, параметри) -> (час закінчення, рядки)
+QUERY_CACHE_TTL_SECONDS = 30
+_QUERY_CACHE: dict[tuple[str, tuple], tuple[float, list[sqlite3.Row]]] = {}
+
+# Налаштування, які діють у межах одного з'єднання і задаються при його відкритті
+CONNECTION_PRAGMAS = """
+PRAGMA foreign_keys = ON;
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA mmap_size = 268435456;
+PRAGMA cache_size = -20000;
+"""
+
+# Студенти та дисципліни для випадних списків форм оцінок за один запит
+SQL_GRADE_FORM_OPTIONS = """
+    SELECT 'student' AS kind, id, name, NULL AS title FROM student
+    UNION ALL
+    SELECT 'course', id, NULL, title FROM course
+    ORDER BY kind, name, title
+"""
+# Кількість оцінок на одній сторінці списків оцінок
+GRADES_PAGE_SIZE = 100
+# Найбільше значення OFFSET, яке SQLite приймає як 64-бітне ціле
+SQLITE_MAX_OFFSET = 2**63 - 1
+SQL_GRADES_LIST = """
+    SELECT points.id,
+           student.name AS student_name,
+           course.title AS course_title,
+           course.semester,
+           points.value
+    FROM points
+    JOIN student ON student.id = points.id_student
+    JOIN course ON course.id = points.id_course
+    ORDER BY student.name ASC, course.title ASC, points.id ASC
+    LIMIT ? OFFSET ?
+"""
+
+# Номер літери ECTS без розгалужень: 0 = FX, 1 = E, ..., 5 = A (як індекс у ECTS_LETTERS).
+# Для оцінки без значення вираз дає NULL, і вона не потрапляє до жодної літери.
+ECTS_BUCKET_SQL = (
+    "(value >= 60) + (value >= 64) + (value >= 74) + (value >= 82) + (value >= 90)"
+)
+
+# Агрегати для звітів зберігаються в зведених таблицях і перераховуються
+# тригерами лише для дисципліни / студента-семестру, яких торкнувся запис.
+# Оцінки неіснуючих студентів чи дисциплін у зведення не потрапляють.
+SQL_REFRESH_SUMMARY_BY_COURSE = """
+    INSERT INTO points_summary_by_course
+    SELECT
+        id_course,
+        CAST(ROUND(AVG(value) * 100) AS INTEGER),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE bucket = 5),
+        COUNT(*) FILTER (WHERE bucket = 4),
+        COUNT(*) FILTER (WHERE bucket = 3),
+        COUNT(*) FILTER (WHERE bucket = 2),
+        COUNT(*) FILTER (WHERE bucket = 1),
+        COUNT(*) FILTER (WHERE bucket = 0)
+    FROM (
+        SELECT id_course, value, {bucket} AS bucket
+        FROM points
+        JOIN course ON course.id = points.id_course
+        {where}
+    )
+    GROUP BY id_course
+"""
+SQL_REFRESH_SUMMARY_BY_STUDENT_SEM = """
+    INSERT INTO points_summary_by_student_sem
+    SELECT
+        graded.id_student,
+        course.semester,
+        COUNT(*) FILTER (WHERE graded.bucket = 5),
+        COUNT(*) FILTER (WHERE graded.bucket = 4),
+        COUNT(*) FILTER (WHERE graded.bucket = 3),
+        COUNT(*) FILTER (WHERE graded.bucket = 2),
+        COUNT(*) FILTER (WHERE graded.bucket = 1),
+        COUNT(*) FILTER (WHERE graded.bucket = 0)
+    FROM (SELECT id_student, id_course, {bucket} AS bucket FROM points) AS graded
+    JOIN course ON course.id = graded.id_course
+    JOIN student ON student.id = graded.id_student
+    {where}
+    GROUP BY graded.id_student, course.semester
+"""
+
+
+class PooledConnection(sqlite3.Connection):
+    """З'єднання з БД, яке пам'ятає час останнього PRAGMA optimize."""
+
+    optimized_at: float
+
+
+def _open_conn() -> PooledConnection:
+    """Відкриває нове з'єднання з БД з налаштуваннями додатку."""
+    conn = sqlite3.connect(
+        DB_PATH,
+        cached_statements=256,
+        check_same_thread=False,
+        factory=PooledConnection,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.executescript(CONNECTION_PRAGMAS)
+    conn.optimized_at = time.monotonic()
+    return conn
+
+
+def _optimize_conn(conn: PooledConnection) -> None:
+    """
+    Дозволяє SQLite оновити статистику планувальника для з'єднання.
+    PRAGMA optimize може запустити ANALYZE і вимагати блокування на запис,
+    тож помилки (наприклад, "database is locked") ігноруються.
+    """
+    conn.optimized_at = time.monotonic()
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error:
+        pass
+
+
+def _thread_conn() -> sqlite3.Connection:
+    """Повертає з'єднання потоку для коду поза контекстом додатку."""
+    conn = getattr(_THREAD_DB, "conn", None)
+    if conn is None:
+        conn = _open_conn()
+        _THREAD_DB.conn = conn
+    return conn
+
+
+def get_conn() -> sqlite3.Connection:
+    """
+    Повертає з'єднання з БД для поточного запиту.
+    Запит бере відкрите з'єднання зі спільного пулу (або відкриває нове, якщо пул
+    порожній), тож з'єднання та кеш підготовлених операторів переживають запит
+    незалежно від того, чи створює сервер новий потік для кожного клієнта.
+    Поза контекстом додатку (скрипти, REPL) повертає з'єднання потоку без g.
+    """
+    if not has_app_context():
+        return _thread_conn()
+    if "db" not in g:
+        try:
+            g.db = _DB_POOL.get_nowait()
+        except queue.Empty:
+            g.db = _open_conn()
+    return g.db
 
 
 def fetch_all(query: str, params: tuple = ()) -> list[sqlite3.Row]:
     """Виконує запит та повертає всі результати як словники."""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.execute(query, params)
-        return cursor.fetchall()
+    return get_conn().execute(query, params).fetchall()
 
 
 def fetch_one(query: str, params: tuple = ()) -> sqlite3.Row | None:
-    rows = fetch_all(query, params)
-    return rows[0] if rows else None
+    return get_conn().execute(query, params).fetchone()
+
+
+def _after_write() -> None:
+    """Скидає кеш довідників після запису в БД."""
+    _QUERY_CACHE.clear()
 
 
 def execute(query: str, params: tuple = ()) -> None:
     """Виконує змінюючий запит (INSERT/UPDATE/DELETE)."""
-    with sqlite3.connect(DB_PATH) as conn:
+    conn = get_conn()
+    with conn:
         conn.execute(query, params)
-        conn.commit()
+    _after_write()
+
+
+def execute_many(query: str, params_seq: list[tuple]) -> None:
+    """
+    Виконує змінюючий запит для кожного набору параметрів однією транзакцією
+    (наприклад, пакетне додавання оцінок).
+    """
+    conn = get_conn()
+    with conn:
+        conn.executemany(query, params_seq)
+    _after_write()
+
+
+def fetch_all_cached(query: str, params: tuple = ()) -> list[sqlite3.Row]:
+    """
+    Як fetch_all, але повторно використовує результат протягом
+    QUERY_CACHE_TTL_SECONDS. Кеш скидається після кожного запису через execute.
+    """
+    now = time.monotonic()
+    key = (query, params)
+    cached = _QUERY_CACHE.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    rows = fetch_all(query, params)
+    _QUERY_CACHE[key] = (now + QUERY_CACHE_TTL_SECONDS, rows)
+    return rows
 
 
-def _cleanup_expired_sessions() -> None:
-    """Видаляє прострочені сесії з пам'яті."""
+def fetch_grades_page(page: int) -> tuple[list[sqlite3.Row], bool]:
+    """
+    Повертає оцінки для сторінки page (нумерація з 1) та ознаку наявності наступної.
+    Вибирає на один рядок більше за розмір сторінки, щоб не рахувати всі записи.
+    """
+    offset = (page - 1) * GRADES_PAGE_SIZE
+    if offset > SQLITE_MAX_OFFSET:
+        # Такої сторінки точно немає, а SQLite не прийме таке число
+        return [], False
+    rows = fetch_all(SQL_GRADES_LIST, (GRADES_PAGE_SIZE + 1, offset))
+    return rows[:GRADES_PAGE_SIZE], len(rows) > GRADES_PAGE_SIZE
+
+
+def fetch_grade_form_options() -> tuple[list[sqlite3.Row], list[sqlite3.Row]]:
+    """Повертає списки студентів і дисциплін для форм додавання та редагування оцінок."""
+    rows = fetch_all_cached(SQL_GRADE_FORM_OPTIONS)
+    students = [row for row in rows if row["kind"] == "student"]
+    courses = [row for row in rows if row["kind"] == "course"]
+    return students, courses
+
+
+def _cleanup_expired_sessions(force: bool = False) -> None:
+    """
+    Видаляє прострочені сесії з пам'яті.
+    Переглядає лише вершину купи термінів дії, а не всі сесії, і виконується
+    не частіше ніж раз на SESSION_SWEEP_INTERVAL_SECONDS, якщо не задано force.
+    """
+    global _last_sweep_at
     now = int(time.time())
-    expired_keys = [
-        sid for sid, data in SESSIONS.items()
-        if data.get("expires_at", 0) < now
-    ]
-    for sid in expired_keys:
-        SESSIONS.pop(sid, None)
+    with _SESSION_HEAP_LOCK:
+        if not force and now - _last_sweep_at < SESSION_SWEEP_INTERVAL_SECONDS:
+            return
+        _last_sweep_at = now
+        while _EXPIRY_HEAP and _EXPIRY_HEAP[0][0] < now:
+            expires_at, sid = heapq.heappop(_EXPIRY_HEAP)
+            data = SESSIONS.get(sid)
+            if data is None:
+                continue
+            if data.get("expires_at", 0) <= expires_at:
+                SESSIONS.pop(sid, None)
+            else:
+                # Сесію продовжено після запису в купу — плануємо перевірку на новий термін
+                heapq.heappush(_EXPIRY_HEAP, (data["expires_at"], sid))
 
 
 def create_session(user_id: int, login: str) -> str:
@@ -52,32 +311,38 @@ def create_session(user_id: int, login: str) -> str:
     Створює сесію для користувача та повертає криптографічно надійний ідентифікатор.
     """
     _cleanup_expired_sessions()
-    session_id = secrets.token_urlsafe(32)
+    session_id = secrets.token_hex(24)
     now = int(time.time())
+    expires_at = now + SESSION_TTL_SECONDS
     SESSIONS[session_id] = {
         "user_id": user_id,
         "login": login,
         "created_at": now,
-        "expires_at": now + SESSION_TTL_SECONDS,
+        "expires_at": expires_at,
     }
+    with _SESSION_HEAP_LOCK:
+        heapq.heappush(_EXPIRY_HEAP, (expires_at, session_id))
     return session_id
 
 
 def get_session(session_id: str | None) -> dict | None:
-    """Повертає дані сесії або None, якщо її не існує чи вона прострочена."""
+    """
+    Повертає дані сесії або None, якщо її не існує чи вона прострочена.
+    Чинна сесія перевіряється за O(1); прибирання інших сесій запускається
+    лише тоді, коли запитаної сесії немає або вона прострочена.
+    """
     if not session_id:
         return None
-    _cleanup_expired_sessions()
-    data = SESSIONS.get(session_id)
-    if data is None:
-        return None
     now = int(time.time())
-    if data.get("expires_at", 0) < now:
+    data = SESSIONS.get(session_id)
+    if data is not None and data.get("expires_at", 0) >= now:
+        # Продовжуємо життя сесії при активності користувача
+        data["expires_at"] = now + SESSION_TTL_SECONDS
+        return data
+    if data is not None:
         SESSIONS.pop(session_id, None)
-        return None
-    # Продовжуємо життя сесії при активності користувача
-    data["expires_at"] = now + SESSION_TTL_SECONDS
-    return data
+    _cleanup_expired_sessions()
+    return None
 
 
 def destroy_session(session_id: str | None) -> None:
@@ -85,6 +350,7 @@ def destroy_session(session_id: str | None) -> None:
     if not session_id:
         return
     SESSIONS.pop(session_id, None)
+    _cleanup_expired_sessions()
 
 
 def login_required(view_func):
@@ -94,14 +360,73 @@ def login_required(view_func):
     """
     @wraps(view_func)
     def wrapped(*args, **kwargs):
-        current = getattr(g, "current_user", None)
-        if not current:
-            return redirect(url_for("login"))
+        if not g.current_user:
+            return redirect(LOGIN_URL)
         return view_func(*args, **kwargs)
 
     return wrapped
 
 
+def etag_by_data_version(view_func):
+    """
+    Декоратор для сторінок, що лише читають БД.
+    Відповідає 304 лише з одним запитом версії даних і без рендерингу, якщо в браузера вже є
+    актуальна версія сторінки. ETag залежить від версії даних у БД (враховує
+    і зміни в обхід додатку) та користувача, бо шапка сторінки відрізняється
+    для автентифікованих користувачів.
+    """
+    @wraps(view_func)
+    def wrapped(*args, **kwargs):
+        current = g.current_user
+        user_id = current["user_id"] if current else 0
+        db_version = fetch_one("SELECT version FROM data_version WHERE id = 1")["version"]
+        etag = f"{DATA_ETAG_PREFIX}-{db_version}-{user_id}"
+        if request.if_none_match.contains(etag):
+            response = make_response("", 304)
+        else:
+            response = make_response(view_func(*args, **kwargs))
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Cookie")
+        return response
+
+    return wrapped
+
+
+def _student_sem_refresh_statements(students: str, semesters: str) -> str:
+    """
+    Повертає SQL, що перераховує рядки points_summary_by_student_sem для
+    студентів зі списку students і семестрів зі списку semesters
+    (вирази SQL, придатні для IN (...), у тілі тригера).
+    """
+    refresh = SQL_REFRESH_SUMMARY_BY_STUDENT_SEM.format(
+        bucket=ECTS_BUCKET_SQL,
+        where=f"WHERE graded.id_student IN ({students}) AND course.semester IN ({semesters})",
+    )
+    return f"""
+        DELETE FROM points_summary_by_student_sem
+        WHERE student_id IN ({students}) AND semester IN ({semesters});
+        {refresh};
+    """
+
+
+def _summary_refresh_statements(row: str) -> str:
+    """
+    Повертає SQL, що перераховує зведені рядки для запису points
+    з псевдонімом row (NEW або OLD) у тілі тригера.
+    """
+    semester = f"SELECT semester FROM course WHERE id = {row}.id_course"
+    refresh_by_course = SQL_REFRESH_SUMMARY_BY_COURSE.format(
+        bucket=ECTS_BUCKET_SQL,
+        where=f"WHERE id_course = {row}.id_course",
+    )
+    return f"""
+        DELETE FROM points_summary_by_course WHERE course_id = {row}.id_course;
+        {refresh_by_course};
+        {_student_sem_refresh_statements(f"{row}.id_student", semester)}
+    """
+
+
 def init_db() -> None:
     """
     Створює всі необхідні таблиці бази даних, якщо вони ще не існують.
@@ -111,9 +436,22 @@ def init_db() -> None:
       - course: дисципліни (id, title, semester)
       - points: оцінки (id, id_student, id_course, value)
       - users: користувачі (id, login, password_hash)
+      - data_version: лічильник змін points, student і course
+
+    Також створює індекси для з'єднань таблиці points зі student та course
+    і зведені таблиці points_summary_by_course / points_summary_by_student_sem,
+    які тригери оновлюють при зміні оцінок.
     """
     with sqlite3.connect(DB_PATH) as conn:
         cursor = conn.cursor()
+
+        # WAL зберігається у файлі БД: читання не блокуються записом
+        cursor.execute("PRAGMA journal_mode = WAL")
+
+        # Уся ініціалізація — одна транзакція: sqlite3 виконує DDL в автокоміті, і без
+        # неї повторний імпорт модуля поки працює сервер на мить залишав би його
+        # без зведених таблиць чи тригерів
+        cursor.execute("BEGIN IMMEDIATE")
         
         # Створюємо таблицю студентів
         cursor.execute(
@@ -160,6 +498,126 @@ def init_db() -> None:
             )
             """
         )
+
+        # Індекси для з'єднань і сортувань у звітах та рейтингах
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_points_student ON points(id_student, id_course)"
+        )
+        # Покриваючий індекс для рейтингу: WHERE id_course, ORDER BY value DESC, id_student
+        cursor.execute("DROP INDEX IF EXISTS idx_points_course")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_points_course_value "
+            "ON points(id_course, value DESC, id_student)"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_course_title ON course(title)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_student_name ON student(name)")
+
+        # Лічильник змін даних для ETag сторінок звітів. Його збільшують тригери,
+        # тож він враховує й зміни, зроблені в обхід додатку
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+            """
+        )
+        cursor.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+        for table in ("points", "student", "course"):
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                name = f"trg_{table}_data_version_{event.lower()}"
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(
+                    f"""
+                    CREATE TRIGGER {name} AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE data_version SET version = version + 1 WHERE id = 1;
+                    END
+                    """
+                )
+
+        # Зведені таблиці для звітів по дисциплінах і по студентах/семестрах.
+        # Вони містять лише похідні дані, тож при запуску створюються наново
+        # за поточною схемою і повністю заповнюються нижче.
+        cursor.execute("DROP TABLE IF EXISTS points_summary_by_course")
+        cursor.execute("DROP TABLE IF EXISTS points_summary_by_student_sem")
+        cursor.execute(
+            """
+            CREATE TABLE points_summary_by_course (
+                course_id INTEGER PRIMARY KEY,
+                avg_x100 INTEGER,
+                cnt INTEGER NOT NULL,
+                A_cnt INTEGER NOT NULL,
+                B_cnt INTEGER NOT NULL,
+                C_cnt INTEGER NOT NULL,
+                D_cnt INTEGER NOT NULL,
+                E_cnt INTEGER NOT NULL,
+                FX_cnt INTEGER NOT NULL
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE points_summary_by_student_sem (
+                student_id INTEGER NOT NULL,
+                semester INTEGER NOT NULL,
+                A_cnt INTEGER NOT NULL,
+                B_cnt INTEGER NOT NULL,
+                C_cnt INTEGER NOT NULL,
+                D_cnt INTEGER NOT NULL,
+                E_cnt INTEGER NOT NULL,
+                FX_cnt INTEGER NOT NULL,
+                PRIMARY KEY (student_id, semester)
+            )
+            """
+        )
+
+        # Тригери підтримують зведені таблиці актуальними після кожної зміни points.
+        # Їх перестворюємо при запуску, щоб у БД завжди була поточна версія тіла.
+        triggers = {
+            "trg_points_summary_ai": ("AFTER INSERT", ("NEW",)),
+            "trg_points_summary_ad": ("AFTER DELETE", ("OLD",)),
+            "trg_points_summary_au": ("AFTER UPDATE", ("OLD", "NEW")),
+        }
+        for name, (event, rows) in triggers.items():
+            body = "".join(_summary_refresh_statements(row) for row in rows)
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"CREATE TRIGGER {name} {event} ON points BEGIN {body} END")
+
+        # Зведення за семестрами залежить і від course.semester, тож зміна семестру
+        # або видалення дисципліни перераховує рядки студентів, що мають з неї оцінки
+        course_students = "SELECT id_student FROM points WHERE id_course = OLD.id"
+        dependent_triggers = {
+            "trg_course_summary_au": (
+                "AFTER UPDATE OF semester ON course",
+                _student_sem_refresh_statements(
+                    course_students, "OLD.semester, NEW.semester"
+                ),
+            ),
+            "trg_course_summary_ad": (
+                "AFTER DELETE ON course",
+                "DELETE FROM points_summary_by_course WHERE course_id = OLD.id;"
+                + _student_sem_refresh_statements(course_students, "OLD.semester"),
+            ),
+            "trg_student_summary_ad": (
+                "AFTER DELETE ON student",
+                "DELETE FROM points_summary_by_student_sem WHERE student_id = OLD.id;",
+            ),
+        }
+        for name, (event, body) in dependent_triggers.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"CREATE TRIGGER {name} {event} BEGIN {body} END")
+
+        # Повністю заповнюємо зведення, враховуючи й зміни БД в обхід додатку
+        cursor.execute(
+            SQL_REFRESH_SUMMARY_BY_COURSE.format(bucket=ECTS_BUCKET_SQL, where="")
+        )
+        cursor.execute(
+            SQL_REFRESH_SUMMARY_BY_STUDENT_SEM.format(bucket=ECTS_BUCKET_SQL, where="")
+        )
+
+        # Оновлюємо статистику, щоб планувальник запитів використовував індекси
+        cursor.execute("ANALYZE")
         
         conn.commit()
 
@@ -168,7 +626,7 @@ def create_user(login: str, password: str) -> None:
     """
     Створює нового користувача, зберігаючи пароль у вигляді криптографічного хеша.
     """
-    password_hash = generate_password_hash(password)
+    password_hash = PASSWORD_HASHER.hash(password)
     execute(
         """
         INSERT INTO users (login, password_hash)
@@ -178,14 +636,49 @@ def create_user(login: str, password: str) -> None:
     )
 
 
+def check_user_password(user: sqlite3.Row, password: str) -> bool:
+    """
+    Перевіряє пароль користувача за збереженим хешем.
+    Після успішної перевірки застарілий хеш (Werkzeug або Argon2 зі старими
+    параметрами) замінюється новим хешем Argon2id.
+    """
+    password_hash = user["password_hash"]
+    if password_hash.startswith(ARGON2_HASH_PREFIX):
+        try:
+            PASSWORD_HASHER.verify(password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+        needs_rehash = PASSWORD_HASHER.check_needs_rehash(password_hash)
+    else:
+        if not check_password_hash(password_hash, password):
+            return False
+        needs_rehash = True
+
+    if needs_rehash:
+        execute(
+            "UPDATE users SET password_hash = ? WHERE id = ?",
+            (PASSWORD_HASHER.hash(password), user["id"]),
+        )
+    return True
+
+
+def _dummy_password_check(password: str) -> None:
+    """Виконує перевірку пароля з тією ж вартістю, що й для справжнього користувача."""
+    try:
+        PASSWORD_HASHER.verify(DUMMY_PASSWORD_HASH, password)
+    except VerificationError:
+        pass
+
+
 def verify_user_password(login: str, password: str) -> bool:
     """
     Перевіряє правильність пароля користувача за логіном.
     """
     user = fetch_one("SELECT id, login, password_hash FROM users WHERE login = ?", (login,))
     if user is None:
+        _dummy_password_check(password)
         return False
-    return check_password_hash(user["password_hash"], password)
+    return check_user_password(user, password)
 
 
 # Ініціалізуємо БД (створюємо таблицю users за потреби)
@@ -198,20 +691,51 @@ app = Flask(
     static_folder='addition/static'
 )
 
+# Скомпільовані шаблони зберігаються на диску і не компілюються заново після перезапуску
+JINJA_CACHE_DIR.mkdir(exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(JINJA_CACHE_DIR))
+
+# Шаблони рендеримо лише через render_template зі спільного app.jinja_env:
+# render_template_string і власні Environment() компілюють шаблон при кожному
+# виклику в обхід кешу. Кеш середовища має вміщати всі шаблони додатку.
+assert app.jinja_env.cache is not None and app.jinja_env.cache.capacity >= 400
+
+
+@app.teardown_appcontext
+def release_db(exception: BaseException | None) -> None:
+    """
+    Повертає з'єднання з БД у пул після обробки запиту.
+    Незавершену транзакцію відкочуємо, щоб вона не перейшла в наступний запит.
+    Якщо пул заповнений, з'єднання закривається (перед цим виконується PRAGMA optimize).
+    """
+    db = g.pop("db", None)
+    if db is None:
+        return
+    if db.in_transaction:
+        db.rollback()
+    if time.monotonic() - db.optimized_at >= OPTIMIZE_INTERVAL_SECONDS:
+        _optimize_conn(db)
+    try:
+        _DB_POOL.put_nowait(db)
+    except queue.Full:
+        _optimize_conn(db)
+        db.close()
+
 
 @app.before_request
 def load_current_user() -> None:
     """
-    Читає ідентифікатор сесії з cookie та завантажує дані користувача в g.current_user.
+    Читає ідентифікатор сесії з cookie в g.session_id та завантажує дані
+    користувача в g.current_user.
     """
-    session_id = request.cookies.get("session_id")
-    g.current_user = get_session(session_id)
+    g.session_id = request.cookies.get("session_id")
+    g.current_user = get_session(g.session_id)
 
 
 @app.context_processor
 def inject_current_user():
     """Додає інформацію про поточного користувача у контекст шаблонів."""
-    return {"current_user": getattr(g, "current_user", None)}
+    return {"current_user": g.current_user}
 
 
 @app.after_request
@@ -241,11 +765,14 @@ def login():
             "SELECT id, login, password_hash FROM users WHERE login = ?",
             (login_value,),
         )
-        if not user or not check_password_hash(user["password_hash"], password):
+        if user is None:
+            _dummy_password_check(password)
+            error = "Невірний логін або пароль."
+        elif not check_user_password(user, password):
             error = "Невірний логін або пароль."
         else:
             session_id = create_session(user["id"], user["login"])
-            response = redirect(url_for("root_index"))
+            response = redirect(ROOT_URL)
             # У cookie зберігаємо лише випадковий ідентифікатор сесії
             response.set_cookie(
                 "session_id",
@@ -265,9 +792,8 @@ def logout():
     """
     Завершує сесію користувача на сервері та видаляє cookie з ідентифікатором сесії.
     """
-    session_id = request.cookies.get("session_id")
-    destroy_session(session_id)
-    response = redirect(url_for("root_index"))
+    destroy_session(g.session_id)
+    response = redirect(ROOT_URL)
     response.delete_cookie("session_id")
     return response
 
@@ -278,7 +804,7 @@ def session_status():
     Повертає інформацію про поточного користувача (для клієнтського UI).
     200 + login, якщо сесія чинна, 401 — якщо ні.
     """
-    current = getattr(g, "current_user", None)
+    current = g.current_user
     if not current:
         return {"authenticated": False}, 401
     return {"authenticated": True, "login": current.get("login")}, 200
@@ -291,34 +817,43 @@ def debug_sessions():
     Проста сторінка для перегляду активних сесій у пам'яті.
     Доступна лише адміністратору (користувач з логіном 'admin').
     """
-    current = getattr(g, "current_user", None)
-    if not current or current.get("login") != "admin":
+    current = g.current_user
+    if not current or current["login"] != "admin":
         abort(403)
 
     # Очищаємо прострочені сесії перед відображенням
-    _cleanup_expired_sessions()
+    _cleanup_expired_sessions(force=True)
     return render_template("sessions.html.j2", sessions=SESSIONS)
 
 
 @app.route('/')
 def root_index():
     # Віддаємо існуючий статичний index.html з кореня проєкту
-    return send_from_directory('.', 'index.html')
+    return send_from_directory(
+        '.', 'index.html', max_age=ROOT_FILES_MAX_AGE_SECONDS, conditional=True
+    )
 
 
 @app.route('/style.css')
 def root_style():
-    return send_from_directory('.', 'style.css')
+    return send_from_directory(
+        '.', 'style.css', max_age=ROOT_FILES_MAX_AGE_SECONDS, conditional=True
+    )
 
 
 @app.route('/script.js')
 def root_script():
-    return send_from_directory('.', 'script.js')
+    return send_from_directory(
+        '.', 'script.js', max_age=ROOT_FILES_MAX_AGE_SECONDS, conditional=True
+    )
 
 
 @app.route('/images/<path:filename>')
 def images(filename: str):
-    return send_from_directory('images', filename)
+    # Браузер кешує зображення, а повторні запити отримують 304 за If-Modified-Since/ETag
+    return send_from_directory(
+        'images', filename, max_age=IMAGES_MAX_AGE_SECONDS, conditional=True
+    )
 
 
 @app.route("/hello/<name>")
@@ -342,41 +877,46 @@ def form():
 
 
 @app.route("/grades")
+@etag_by_data_version
 def grades():
-    marks = fetch_all(
-        """
-        SELECT points.id,
-               student.name AS student_name,
-               course.title AS course_title,
-               course.semester,
-               points.value
-        FROM points
-        JOIN student ON student.id = points.id_student
-        JOIN course ON course.id = points.id_course
-        ORDER BY student.name ASC, course.title ASC
-        """
+    page = max(request.args.get("page", 1, type=int), 1)
+    marks, has_next = fetch_grades_page(page)
+    if page > 1 and not marks:
+        abort(404, description="Сторінку не знайдено")
+    return render_template(
+        "grades.html.j2",
+        grades=marks,
+        page=page,
+        has_next=has_next,
+        offset=(page - 1) * GRADES_PAGE_SIZE,
     )
-    return render_template("grades.html.j2", grades=marks)
+
+
+# Нижні межі літер ECTS (E, D, C, B, A) та відповідні літери
+ECTS_BOUNDS = (60, 64, 74, 82, 90)
+ECTS_LETTERS = ("FX", "E", "D", "C", "B", "A")
+# Літера для кожного цілого балу 0..100; межі цілі, тож дробова частина не впливає
+ECTS_LETTER_BY_SCORE = tuple(
+    ECTS_LETTERS[bisect_right(ECTS_BOUNDS, score)] for score in range(101)
+)
 
 
 def ects_letter(value: float) -> str:
     """Перетворення числової оцінки у літерну шкалу ECTS."""
-    if value >= 90:
-        return "A"
-    if value >= 82:
-        return "B"
-    if value >= 74:
-        return "C"
-    if value >= 64:
-        return "D"
-    if value >= 60:
-        return "E"
-    return "FX"
+    return ECTS_LETTER_BY_SCORE[max(0, min(100, int(value)))]
+
+
+@app.template_filter("avg2")
+def format_avg_x100(value: int | None) -> str:
+    """Форматує середній бал, збережений у сотих частках, з двома знаками після коми."""
+    if value is None:
+        return "—"
+    return f"{value / 100:.2f}"
 
 
 @app.route("/students")
 def students():
-    students_list = fetch_all(
+    students_list = fetch_all_cached(
         "SELECT id, name FROM student ORDER BY name ASC"
     )
     return render_template("students.html.j2", students=students_list)
@@ -384,25 +924,27 @@ def students():
 
 @app.route("/students/<int:student_id>")
 def student_detail(student_id: int):
-    student = fetch_one(
-        "SELECT id, name FROM student WHERE id = ?",
-        (student_id,),
-    )
-    if student is None:
-        abort(404, description="Студента не знайдено")
-
-    grades = fetch_all(
+    # Студент і його оцінки одним запитом; студент без оцінок дає один рядок з NULL
+    rows = fetch_all(
         """
-        SELECT course.title AS course_title,
+        SELECT student.id,
+               student.name,
+               course.title AS course_title,
                course.semester,
                points.value
-        FROM points
-        JOIN course ON course.id = points.id_course
-        WHERE points.id_student = ?
+        FROM student
+        LEFT JOIN points ON points.id_student = student.id
+        LEFT JOIN course ON course.id = points.id_course
+        WHERE student.id = ?
         ORDER BY course.title ASC
         """,
         (student_id,),
     )
+    if not rows:
+        abort(404, description="Студента не знайдено")
+
+    student = rows[0]
+    grades = [row for row in rows if row["course_title"] is not None]
     return render_template(
         "student_detail.html.j2",
         student=student,
@@ -412,7 +954,7 @@ def student_detail(student_id: int):
 
 @app.route("/subjects")
 def subjects():
-    subject_list = fetch_all(
+    subject_list = fetch_all_cached(
         "SELECT id, title, semester FROM course ORDER BY title ASC"
     )
     return render_template("subjects.html.j2", subjects=subject_list)
@@ -421,7 +963,7 @@ def subjects():
 @app.route("/ratings")
 def ratings():
     course_id = request.args.get("course_id", type=int)
-    courses = fetch_all("SELECT id, title FROM course ORDER BY title ASC")
+    courses = fetch_all_cached("SELECT id, title FROM course ORDER BY title ASC")
 
     selected_course = None
     rating_rows: list[sqlite3.Row] = []
@@ -455,12 +997,7 @@ def ratings():
 @login_required
 def add_grade():
     # Отримуємо списки студентів та дисциплін для випадних списків
-    students = fetch_all(
-        "SELECT id, name FROM student ORDER BY name ASC"
-    )
-    courses = fetch_all(
-        "SELECT id, title FROM course ORDER BY title ASC"
-    )
+    students, courses = fetch_grade_form_options()
 
     error: str | None = None
 
@@ -489,14 +1026,19 @@ def add_grade():
                         error = "Оцінка повинна бути в діапазоні від 0 до 100."
                     else:
                         value_int = round(value)
-                        execute(
-                            """
-                            INSERT INTO points (id_student, id_course, value)
-                            VALUES (?, ?, ?)
-                            """,
-                            (student_id_int, course_id_int, int(value_int)),
-                        )
-                        return redirect(url_for("grades"))
+                        try:
+                            execute(
+                                """
+                                INSERT INTO points (id_student, id_course, value)
+                                VALUES (?, ?, ?)
+                                """,
+                                (student_id_int, course_id_int, value_int),
+                            )
+                        except sqlite3.IntegrityError:
+                            # Студента або дисципліну могли видалити, поки форма була відкрита
+                            error = "Некоректні ідентифікатори студента або дисципліни."
+                        else:
+                            return redirect(url_for("grades"))
 
     return render_template(
         "add_grade.html.j2",
@@ -507,6 +1049,7 @@ def add_grade():
 
 
 @app.route("/avg-by-subject")
+@etag_by_data_version
 def avg_by_subject():
     """Середній бал по кожній дисципліні."""
     rows = fetch_all(
@@ -515,11 +1058,10 @@ def avg_by_subject():
             course.id AS course_id,
             course.title AS course_title,
             course.semester,
-            ROUND(AVG(points.value), 2) AS avg_value,
-            COUNT(points.id) AS cnt
+            summary.avg_x100,
+            IFNULL(summary.cnt, 0) AS cnt
         FROM course
-        LEFT JOIN points ON points.id_course = course.id
-        GROUP BY course.id, course.title, course.semester
+        LEFT JOIN points_summary_by_course AS summary ON summary.course_id = course.id
         ORDER BY course.title ASC
         """
     )
@@ -527,6 +1069,7 @@ def avg_by_subject():
 
 
 @app.route("/ects-by-subject")
+@etag_by_data_version
 def ects_by_subject():
     """Кількість оцінок за шкалою ECTS по кожній дисципліні."""
     rows = fetch_all(
@@ -535,15 +1078,14 @@ def ects_by_subject():
             course.id AS course_id,
             course.title AS course_title,
             course.semester,
-            SUM(CASE WHEN points.value >= 90 THEN 1 ELSE 0 END) AS A_cnt,
-            SUM(CASE WHEN points.value >= 82 AND points.value < 90 THEN 1 ELSE 0 END) AS B_cnt,
-            SUM(CASE WHEN points.value >= 74 AND points.value < 82 THEN 1 ELSE 0 END) AS C_cnt,
-            SUM(CASE WHEN points.value >= 64 AND points.value < 74 THEN 1 ELSE 0 END) AS D_cnt,
-            SUM(CASE WHEN points.value >= 60 AND points.value < 64 THEN 1 ELSE 0 END) AS E_cnt,
-            SUM(CASE WHEN points.value < 60 THEN 1 ELSE 0 END) AS FX_cnt
+            IFNULL(summary.A_cnt, 0) AS A_cnt,
+            IFNULL(summary.B_cnt, 0) AS B_cnt,
+            IFNULL(summary.C_cnt, 0) AS C_cnt,
+            IFNULL(summary.D_cnt, 0) AS D_cnt,
+            IFNULL(summary.E_cnt, 0) AS E_cnt,
+            IFNULL(summary.FX_cnt, 0) AS FX_cnt
         FROM course
-        LEFT JOIN points ON points.id_course = course.id
-        GROUP BY course.id, course.title, course.semester
+        LEFT JOIN points_summary_by_course AS summary ON summary.course_id = course.id
         ORDER BY course.title ASC
         """
     )
@@ -551,6 +1093,7 @@ def ects_by_subject():
 
 
 @app.route("/ects-by-student-sem")
+@etag_by_data_version
 def ects_by_student_sem():
     """
     Кількість оцінок за шкалою ECTS по кожному студенту
@@ -561,18 +1104,16 @@ def ects_by_student_sem():
         SELECT
             student.id AS student_id,
             student.name AS student_name,
-            course.semester,
-            SUM(CASE WHEN points.value >= 90 THEN 1 ELSE 0 END) AS A_cnt,
-            SUM(CASE WHEN points.value >= 82 AND points.value < 90 THEN 1 ELSE 0 END) AS B_cnt,
-            SUM(CASE WHEN points.value >= 74 AND points.value < 82 THEN 1 ELSE 0 END) AS C_cnt,
-            SUM(CASE WHEN points.value >= 64 AND points.value < 74 THEN 1 ELSE 0 END) AS D_cnt,
-            SUM(CASE WHEN points.value >= 60 AND points.value < 64 THEN 1 ELSE 0 END) AS E_cnt,
-            SUM(CASE WHEN points.value < 60 THEN 1 ELSE 0 END) AS FX_cnt
-        FROM points
-        JOIN student ON student.id = points.id_student
-        JOIN course ON course.id = points.id_course
-        GROUP BY student.id, student.name, course.semester
-        ORDER BY student.name ASC, course.semester ASC
+            summary.semester,
+            summary.A_cnt,
+            summary.B_cnt,
+            summary.C_cnt,
+            summary.D_cnt,
+            summary.E_cnt,
+            summary.FX_cnt
+        FROM points_summary_by_student_sem AS summary
+        JOIN student ON student.id = summary.student_id
+        ORDER BY student.name ASC, summary.semester ASC
         """
     )
     return render_template("ects_by_student_sem.html.j2", rows=rows)
@@ -582,20 +1123,17 @@ def ects_by_student_sem():
 @login_required
 def edit_grades_list():
     """Список усіх оцінок з посиланнями на редагування та видалення."""
-    marks = fetch_all(
-        """
-        SELECT points.id,
-               student.name AS student_name,
-               course.title AS course_title,
-               course.semester,
-               points.value
-        FROM points
-        JOIN student ON student.id = points.id_student
-        JOIN course ON course.id = points.id_course
-        ORDER BY student.name ASC, course.title ASC
-        """
+    page = max(request.args.get("page", 1, type=int), 1)
+    marks, has_next = fetch_grades_page(page)
+    if page > 1 and not marks:
+        abort(404, description="Сторінку не знайдено")
+    return render_template(
+        "edit_grades_list.html.j2",
+        grades=marks,
+        page=page,
+        has_next=has_next,
+        offset=(page - 1) * GRADES_PAGE_SIZE,
     )
-    return render_template("edit_grades_list.html.j2", grades=marks)
 
 
 @app.route("/edit-grade/<int:grade_id>", methods=["GET", "POST"])
@@ -616,12 +1154,7 @@ def edit_grade(grade_id: int):
     if grade is None:
         abort(404, description="Оцінку не знайдено")
 
-    students = fetch_all(
-        "SELECT id, name FROM student ORDER BY name ASC"
-    )
-    courses = fetch_all(
-        "SELECT id, title FROM course ORDER BY title ASC"
-    )
+    students, courses = fetch_grade_form_options()
 
     error: str | None = None
 
@@ -648,15 +1181,20 @@ def edit_grade(grade_id: int):
                         error = "Оцінка повинна бути в діапазоні від 0 до 100."
                     else:
                         value_int = round(value)
-                        execute(
-                            """
-                            UPDATE points
-                            SET id_student = ?, id_course = ?, value = ?
-                            WHERE id = ?
-                            """,
-                            (student_id_int, course_id_int, int(value_int), grade_id),
-                        )
-                        return redirect(url_for("edit_grades_list"))
+                        try:
+                            execute(
+                                """
+                                UPDATE points
+                                SET id_student = ?, id_course = ?, value = ?
+                                WHERE id = ?
+                                """,
+                                (student_id_int, course_id_int, value_int, grade_id),
+                            )
+                        except sqlite3.IntegrityError:
+                            # Студента або дисципліну могли видалити, поки форма була відкрита
+                            error = "Некоректні ідентифікатори студента або дисципліни."
+                        else:
+                            return redirect(url_for("edit_grades_list"))
 
     return render_template(
         "edit_grade.html.j2",
@@ -698,7 +1236,18 @@ def delete_grade(grade_id: int):
     return render_template("delete_grade.html.j2", grade=grade)
 
 
+# Адреси для перенаправлень, які не залежать від запиту, обчислюємо один раз
+# після реєстрації всіх маршрутів
+with app.test_request_context():
+    LOGIN_URL = url_for("login")
+    ROOT_URL = url_for("root_index")
+
+
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', debug=True)
+    # Вбудований сервер Werkzeug лише для локального запуску (режим налагодження:
+    # flask --app app run --debug). У продакшні використовуйте WSGI-сервер з потоками,
+    # наприклад: gunicorn --workers 1 --threads 8 app:app
+    # Один процес обов'язковий, бо сесії зберігаються в пам'яті процесу (SESSIONS).
+    app.run(host='0.0.0.0', threaded=True)
 
 